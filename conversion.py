@@ -14,11 +14,14 @@ Schema:
     - description: Descriptive text (e.g., for charts)
     - text: Extracted text (for paragraphs)
     - table_data: 2D list for table rows (for tables)
+    Fields with null values are omitted from the output (except 'type').
 
 Dependencies:
 - unstructured[all-docs] (pip install "unstructured[all-docs]")
 - fitz (PyMuPDF) for page count
 - tqdm for progress
+- orjson (optional) for fast JSON serialization of large outputs
+- pyarrow (optional) for Parquet/Arrow columnar output
 - logging for detailed output
 
 For optimal performance, use 'hi_res' strategy which requires additional dependencies like detectron2.
@@ -28,21 +31,45 @@ import argparse
 import json
 import logging
 import re
-from collections import defaultdict
-from io import StringIO
+import sys
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
 import fitz  # PyMuPDF
-import pandas as pd
 from tqdm import tqdm
-from unstructured.partition.pdf import partition_pdf
+
+try:
+    import orjson  # Optional: much faster C serializer for large outputs
+except ImportError:
+    orjson = None
 
 # -------------------------
 # CONFIGURATION
 # -------------------------
 DEFAULT_STRATEGY = "hi_res"  # Alternatives: "fast", "ocr_only", "hi_res"
 FALLBACK_STRATEGY = "fast"
+DEFAULT_WORKERS = 1  # Process-pool size for parallel partitioning
+CHUNK_PAGES = 10  # Pages per chunk when splitting for parallel partitioning
+
+# Compiled once at import; matches numbered headings like "1.2.3 Overview".
+_SECTION_RE = re.compile(r"^(\d+(?:\.\d+)*)\s+(.+)$")
+
+# Lightweight tuple-backed record used in the hot loop; materialized into
+# schema dicts only at the final JSON formatting stage.
+ContentItem = namedtuple(
+    "ContentItem", "type section sub_section description text table_data"
+)
+
+# Unstructured category -> schema type; anything unlisted is a paragraph.
+# Values are interned so every content item shares one string object per type.
+_CATEGORY_MAP = {
+    "Table": sys.intern("table"),
+    "Image": sys.intern("chart"),
+    "FigureCaption": sys.intern("chart"),
+}
 
 # Setup logging
 logging.basicConfig(
@@ -67,11 +94,14 @@ def detect_section_subsection(text: str) -> Tuple[Optional[str], Optional[str]]:
     """
     if not text:
         return None, None
-    section_pattern = r"^\d+(\.\d+)*\s+(.+)$"
-    match = re.match(section_pattern, text.strip())
+    stripped = text.strip()
+    # Cheap fast-reject: headers always start with a digit, so most body
+    # paragraphs never reach the regex engine.
+    if not stripped or not stripped[0].isdigit():
+        return None, None
+    match = _SECTION_RE.match(stripped)
     if match:
-        section, content = match.groups()
-        return section, content
+        return match.group(1), match.group(2)
     return None, None
 
 
@@ -85,16 +115,18 @@ def parse_markdown_table(md_text: str) -> Optional[List[List[str]]]:
     Returns:
         Optional[List[List[str]]]: Table data as list of rows, or None if parsing fails.
     """
-    try:
-        # Use pandas to parse the markdown table
-        df = pd.read_csv(StringIO(md_text), sep="|", skiprows=1, engine="python")
-        df = df.applymap(lambda x: str(x).strip() if pd.notnull(x) else "")
-        # Remove any empty columns caused by separators
-        df = df.loc[:, ~df.columns.str.contains("^Unnamed")]
-        return df.values.tolist()
-    except Exception as e:
-        logger.warning(f"Failed to parse markdown table: {e}")
+    # Fast reject: anything without a couple of pipes and at least two
+    # lines cannot be a markdown table, so skip line splitting entirely
+    if not md_text or md_text.count("|") < 2 or "\n" not in md_text:
         return None
+    rows: List[List[str]] = []
+    for line in md_text.splitlines():
+        line = line.strip()
+        # Skip blank lines and separator rows like |---|:---:|
+        if not line or set(line) <= {"|", "-", ":", " "}:
+            continue
+        rows.append([cell.strip() for cell in line.strip("|").split("|")])
+    return rows or None
 
 
 def map_element_type(category: str) -> str:
@@ -107,112 +139,336 @@ def map_element_type(category: str) -> str:
     Returns:
         str: 'paragraph', 'table', or 'chart'.
     """
-    if category == "Table":
-        return "table"
-    elif category in ["Image", "FigureCaption"]:
-        return "chart"
-    else:
-        return "paragraph"
+    return _CATEGORY_MAP.get(category, "paragraph")
 
 
 # -------------------------
 # MAIN PROCESSING FUNCTIONS
 # -------------------------
-def process_pdf(pdf_path: str, strategy: str = DEFAULT_STRATEGY) -> Dict:
+def _partition_chunk(chunk_path: str, strategy: str, page_offset: int) -> List:
     """
-    Processes a PDF file using Unstructured to extract structured content into JSON format.
+    Partitions a single page-range chunk PDF; runs in a worker process.
 
     Args:
-        pdf_path (str): Path to the PDF file.
+        chunk_path (str): Path to the temporary chunk PDF.
         strategy (str): Partitioning strategy ('hi_res', 'fast', etc.).
+        page_offset (int): Number of pages preceding this chunk in the
+            original document, added to each element's page_number.
 
     Returns:
-        Dict: Structured JSON data with pages and content.
+        List: Unstructured elements with corrected page numbers.
     """
-    pdf_file = Path(pdf_path)
-    if not pdf_file.is_file():
-        logger.error(f"PDF file not found: {pdf_path}")
-        raise FileNotFoundError(f"PDF file not found: {pdf_path}")
-
-    # Get total pages for progress
-    doc = fitz.open(pdf_path)
-    total_pages = len(doc)
-    doc.close()
-
-    logger.info(f"Processing PDF: {pdf_path} with strategy '{strategy}'")
+    # Imported lazily: unstructured drags in heavy ML dependencies, and this
+    # runs in worker processes that each pay the import cost anyway.
+    from unstructured.partition.pdf import partition_pdf
 
     try:
         elements = partition_pdf(
-            filename=str(pdf_file),
+            filename=chunk_path,
             strategy=strategy,
-            languages=["eng"],  # Add more languages if needed
-            infer_table_structure=True,  # For hi_res
+            languages=["eng"],
+            infer_table_structure=True,
         )
     except Exception as e:
         if strategy != FALLBACK_STRATEGY:
-            logger.warning(f"Strategy '{strategy}' failed: {e}. Falling back to '{FALLBACK_STRATEGY}'.")
+            logger.warning("Strategy '%s' failed on chunk: %s. Falling back to '%s'.", strategy, e, FALLBACK_STRATEGY)
             elements = partition_pdf(
-                filename=str(pdf_file),
+                filename=chunk_path,
                 strategy=FALLBACK_STRATEGY,
                 languages=["eng"],
             )
         else:
             raise
+    for el in elements:
+        if el.metadata.page_number is not None:
+            el.metadata.page_number += page_offset
+    return elements
+
+
+def _scan_rich_pages(doc) -> List[bool]:
+    """
+    Flags pages that carry images or vector drawings.
+
+    Args:
+        doc: Open fitz.Document.
+
+    Returns:
+        List[bool]: One flag per page; True if the page needs layout detection.
+    """
+    return [
+        bool(page.get_images(full=False)) or bool(page.get_drawings())
+        for page in doc
+    ]
+
+
+def _chunk_ranges(total_pages: int, strategy: str,
+                  rich: Optional[List[bool]]) -> List[Tuple[int, int, str]]:
+    """
+    Computes page-range chunks with a partitioning strategy per chunk.
+
+    Args:
+        total_pages (int): Page count of the document.
+        strategy (str): Strategy for rich pages (and all pages when rich is None).
+        rich (Optional[List[bool]]): Per-page richness flags from _scan_rich_pages,
+            or None to use the same strategy everywhere.
+
+    Returns:
+        List[Tuple[int, int, str]]: (start, stop, strategy) runs of at most
+        CHUNK_PAGES pages, where text-only runs use FALLBACK_STRATEGY.
+    """
+    chunks: List[Tuple[int, int, str]] = []
+    start = 0
+    while start < total_pages:
+        chunk_strategy = strategy if rich is None or rich[start] else FALLBACK_STRATEGY
+        stop = start + 1
+        while (stop < total_pages and stop - start < CHUNK_PAGES
+               and (rich is None or rich[stop] == rich[start])):
+            stop += 1
+        chunks.append((start, stop, chunk_strategy))
+        start = stop
+    return chunks
+
+
+def _partition_chunked(doc, chunks: List[Tuple[int, int, str]], workers: int) -> List:
+    """
+    Splits the PDF into the given page-range chunks and partitions each one.
+
+    Args:
+        doc: Open fitz.Document to split; stays open for the caller.
+        chunks (List[Tuple[int, int, str]]): (start, stop, strategy) page runs.
+        workers (int): Worker processes; 1 partitions chunks sequentially.
+
+    Returns:
+        List: Concatenated elements in document page order.
+    """
+    elements: List = []
+    with tempfile.TemporaryDirectory(prefix="pdf2json_") as tmp_dir:
+        chunk_args = []
+        for start, stop, chunk_strategy in chunks:
+            chunk_path = str(Path(tmp_dir) / f"chunk_{start:05d}.pdf")
+            chunk_doc = fitz.open()
+            chunk_doc.insert_pdf(doc, from_page=start, to_page=stop - 1)
+            chunk_doc.save(chunk_path)
+            chunk_doc.close()
+            chunk_args.append((chunk_path, chunk_strategy, start))
+
+        logger.info("Partitioning %d chunks on %d workers", len(chunk_args), workers)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_partition_chunk, *args) for args in chunk_args]
+                # Collect in submission order so elements stay in page order
+                for future in futures:
+                    elements.extend(future.result())
+        else:
+            for args in chunk_args:
+                elements.extend(_partition_chunk(*args))
+    return elements
 
-    # Group elements by page and build content
-    pages: Dict[int, List[Dict]] = defaultdict(list)
+
+def iter_pages(pdf_path: str, strategy: str = DEFAULT_STRATEGY,
+               workers: int = DEFAULT_WORKERS, route_pages: bool = True,
+               include_bbox: bool = False):
+    """
+    Processes a PDF and yields page dicts one at a time, in page order.
+
+    Suited to streaming output (NDJSON) where the full document dict never
+    needs to exist in memory at once.
+
+    Args:
+        pdf_path (str): Path to the PDF file.
+        strategy (str): Partitioning strategy ('hi_res', 'fast', etc.).
+        workers (int): Worker processes for parallel partitioning (1 = sequential).
+        route_pages (bool): With 'hi_res', route text-only pages through the
+            'fast' strategy so layout detection only runs where it can pay off.
+        include_bbox (bool): Append element bounding boxes to descriptions.
+
+    Yields:
+        Dict: {'page_number': int, 'content': List[Dict]} per non-empty page.
+    """
+    pdf_file = Path(pdf_path)
+    if not pdf_file.is_file():
+        logger.error("PDF file not found: %s", pdf_path)
+        raise FileNotFoundError(f"PDF file not found: {pdf_path}")
+
+    # Deferred so --help and bad-path exits don't pay unstructured's
+    # multi-second transitive import cost.
+    from unstructured.partition.pdf import partition_pdf
+
+    # One fitz.Document serves the page count, the routing pre-scan, and
+    # chunk splitting, so the cross-reference table is parsed only once
+    doc = fitz.open(pdf_path)
+    try:
+        total_pages = len(doc)
+        rich = _scan_rich_pages(doc) if route_pages and strategy == "hi_res" else None
+
+        logger.info("Processing PDF: %s with strategy '%s'", pdf_path, strategy)
+
+        if rich is not None and not all(rich):
+            chunks = _chunk_ranges(total_pages, strategy, rich)
+            elements = _partition_chunked(doc, chunks, workers)
+        elif workers > 1 and total_pages > CHUNK_PAGES:
+            chunks = _chunk_ranges(total_pages, strategy, None)
+            elements = _partition_chunked(doc, chunks, workers)
+        else:
+            try:
+                elements = partition_pdf(
+                    filename=str(pdf_file),
+                    strategy=strategy,
+                    languages=["eng"],  # Add more languages if needed
+                    infer_table_structure=True,  # For hi_res
+                )
+            except Exception as e:
+                if strategy != FALLBACK_STRATEGY:
+                    logger.warning("Strategy '%s' failed: %s. Falling back to '%s'.", strategy, e, FALLBACK_STRATEGY)
+                    elements = partition_pdf(
+                        filename=str(pdf_file),
+                        strategy=FALLBACK_STRATEGY,
+                        languages=["eng"],
+                    )
+                else:
+                    raise
+    finally:
+        doc.close()
+
+    # Group elements by page and build content; page numbers are 1-based,
+    # so index directly into a pre-sized list instead of hashing into a dict
+    pages: List[List[ContentItem]] = [[] for _ in range(total_pages + 1)]
     current_section: Optional[str] = None
     current_subsection: Optional[str] = None
 
-    for el in tqdm(elements, total=len(elements), desc="Processing elements"):
-        page_num = el.metadata.page_number
-        el_type = map_element_type(el.category)
-        text = el.text if el.text else ""
-        section, subsection = detect_section_subsection(text)
-
-        if el.category == "Title":
-            current_section = section or text
-            current_subsection = subsection
-
-        content_item = {
-            "type": el_type,
-            "section": current_section,
-            "sub_section": current_subsection,
-            "description": None,
-            "text": text if el_type != "table" else None,
-            "table_data": None,
-        }
+    # Local bindings avoid repeated global/attribute lookups in the hot loop
+    _map_type = map_element_type
+    _detect = detect_section_subsection
+
+    # Progress per page, not per element: a bar refresh on every one of
+    # potentially tens of thousands of elements is measurable overhead
+    pbar = tqdm(total=total_pages, desc="Processing pages")
+    last_page: Optional[int] = None
+
+    for el in elements:
+        metadata = el.metadata
+        page_num = metadata.page_number
+        if page_num != last_page:
+            pbar.update(1)
+            last_page = page_num
+        category = el.category
+        el_type = _map_type(category)
+        text = el.text or ""
+        section, subsection = _detect(text)
+
+        if category == "Title":
+            # Interned: the same section value is repeated across every item
+            # until the next title, so share one string object
+            current_section = sys.intern(section or text)
+            current_subsection = sys.intern(subsection) if subsection else None
+
+        description: Optional[str] = None
+        item_text: Optional[str] = text
+        table_data: Optional[List[List[str]]] = None
 
         if el_type == "table":
             table_data = parse_markdown_table(text)
-            content_item["table_data"] = table_data
-            content_item["description"] = f"Table on page {page_num}"
+            description = f"Table on page {page_num}"
+            item_text = None
 
         elif el_type == "chart":
-            content_item["description"] = f"Chart/Image on page {page_num} (category: {el.category})"
-            content_item["text"] = None  # Text might be caption
+            description = f"Chart/Image on page {page_num} (category: {category})"
+            item_text = None  # Text might be caption
 
         elif section:
-            content_item["description"] = "Section header"
+            description = "Section header"
+
+        # Add coordinates if requested and available
+        if include_bbox:
+            coordinates = getattr(metadata, "coordinates", None)
+            if coordinates is not None:
+                bbox = ",".join(f"{x:.1f},{y:.1f}" for x, y in coordinates.points)
+                description = (description or "") + f" (bbox=[{bbox}])"
+
+        if page_num is not None:
+            pages[page_num].append(
+                ContentItem(el_type, current_section, current_subsection,
+                            description, item_text, table_data)
+            )
 
-        # Add coordinates if available
-        if hasattr(el.metadata, "coordinates"):
-            bbox = el.metadata.coordinates.points
-            content_item["description"] = (content_item["description"] or "") + f" (bbox={bbox})"
+    pbar.close()
+
+    # Emit pages in order; list index already matches page number.
+    # Null fields are dropped per item ('type' is always kept), which
+    # shrinks the output considerably on paragraph-heavy documents.
+    fields = ContentItem._fields
+    for page_num, content in enumerate(pages):
+        if content:
+            yield {
+                "page_number": page_num,
+                "content": [
+                    {f: v for f, v in zip(fields, item) if v is not None or f == "type"}
+                    for item in content
+                ],
+            }
+
+
+def process_pdf(pdf_path: str, strategy: str = DEFAULT_STRATEGY,
+                workers: int = DEFAULT_WORKERS, route_pages: bool = True,
+                include_bbox: bool = False) -> Dict:
+    """
+    Processes a PDF file using Unstructured to extract structured content into JSON format.
 
-        pages[page_num].append(content_item)
+    Args:
+        pdf_path (str): Path to the PDF file.
+        strategy (str): Partitioning strategy ('hi_res', 'fast', etc.).
+        workers (int): Worker processes for parallel partitioning (1 = sequential).
+        route_pages (bool): With 'hi_res', route text-only pages through the
+            'fast' strategy so layout detection only runs where it can pay off.
+        include_bbox (bool): Append element bounding boxes to descriptions.
 
-    # Sort pages and format result
+    Returns:
+        Dict: Structured JSON data with pages and content.
+    """
     result = {
-        "pages": [
-            {"page_number": page_num, "content": content}
-            for page_num, content in sorted(pages.items())
-        ]
+        "pages": list(iter_pages(pdf_path, strategy, workers=workers,
+                                 route_pages=route_pages, include_bbox=include_bbox))
     }
-    logger.info(f"Processed {len(result['pages'])} pages with {sum(len(c['content']) for c in result['pages'])} content items")
+    logger.info("Processed %d pages with %d content items", len(result["pages"]), sum(len(c["content"]) for c in result["pages"]))
     return result
 
 
+def write_columnar(pages, output_path: Path, output_format: str) -> None:
+    """
+    Writes content items as a flat columnar table in Parquet or Arrow IPC format.
+
+    Each content item becomes one row with its page_number; columnar files
+    compress far better than JSON and load directly into pandas/duckdb.
+
+    Args:
+        pages: Iterable of page dicts as produced by iter_pages.
+        output_path (Path): Destination file path.
+        output_format (str): 'parquet' or 'arrow'.
+    """
+    # Deferred: pyarrow is only needed for columnar output
+    import pyarrow as pa
+
+    columns: Dict[str, list] = {
+        "page_number": [], "type": [], "section": [], "sub_section": [],
+        "description": [], "text": [], "table_data": [],
+    }
+    for page in pages:
+        page_num = page["page_number"]
+        for item in page["content"]:
+            columns["page_number"].append(page_num)
+            for field in ContentItem._fields:
+                columns[field].append(item.get(field))
+
+    table = pa.table(columns)
+    if output_format == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(table, str(output_path))
+    else:
+        with pa.OSFile(str(output_path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+
 # -------------------------
 # ENTRY POINT
 # -------------------------
@@ -222,16 +478,47 @@ def main():
     parser.add_argument("pdf_path", type=str, help="Path to the input PDF file")
     parser.add_argument("-o", "--output", type=str, default="output.json", help="Path to the output JSON file")
     parser.add_argument("-s", "--strategy", type=str, default=DEFAULT_STRATEGY, help="Unstructured partitioning strategy")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help="Worker processes for parallel partitioning")
+    parser.add_argument("--no-page-routing", action="store_true", help="Disable routing text-only pages through the 'fast' strategy")
+    parser.add_argument("--include-bbox", action="store_true", help="Append element bounding boxes to descriptions")
+    parser.add_argument("--ndjson", action="store_true", help="Write one JSON page per line instead of a single document")
+    parser.add_argument("-f", "--format", type=str, default="json", choices=["json", "parquet", "arrow"], help="Output file format (parquet/arrow require pyarrow)")
     args = parser.parse_args()
 
     try:
-        structured_json = process_pdf(args.pdf_path, args.strategy)
         output_path = Path(args.output)
-        with output_path.open("w", encoding="utf-8") as f:
-            json.dump(structured_json, f, indent=4, ensure_ascii=False)
-        logger.info(f"Successfully wrote JSON output to {output_path}")
+        if args.format in ("parquet", "arrow"):
+            write_columnar(
+                iter_pages(args.pdf_path, args.strategy, workers=args.workers,
+                           route_pages=not args.no_page_routing,
+                           include_bbox=args.include_bbox),
+                output_path, args.format,
+            )
+        elif args.ndjson:
+            # Stream pages as newline-delimited JSON: constant output memory
+            with output_path.open("wb") as f:
+                for page in iter_pages(args.pdf_path, args.strategy, workers=args.workers,
+                                       route_pages=not args.no_page_routing,
+                                       include_bbox=args.include_bbox):
+                    if orjson is not None:
+                        f.write(orjson.dumps(page, option=orjson.OPT_APPEND_NEWLINE))
+                    else:
+                        f.write(json.dumps(page, ensure_ascii=False).encode("utf-8"))
+                        f.write(b"\n")
+        else:
+            structured_json = process_pdf(args.pdf_path, args.strategy, workers=args.workers,
+                                          route_pages=not args.no_page_routing,
+                                          include_bbox=args.include_bbox)
+            if orjson is not None:
+                output_path.write_bytes(
+                    orjson.dumps(structured_json, option=orjson.OPT_INDENT_2)
+                )
+            else:
+                with output_path.open("w", encoding="utf-8") as f:
+                    json.dump(structured_json, f, indent=4, ensure_ascii=False)
+        logger.info("Successfully wrote %s output to %s", args.format, output_path)
     except Exception as e:
-        logger.error(f"Failed to process PDF: {str(e)}")
+        logger.error("Failed to process PDF: %s", e)
         raise
 
 